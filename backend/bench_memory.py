@@ -0,0 +1,94 @@
+import asyncio
+import json
+import random
+import tracemalloc
+
+from data_fetcher import DataFetcher
+from snapshot import SnapshotStore, POOL_KEYS
+
+
+# 对比每个更新周期的内存分配: 旧的 dict 快照 + 每个连接 send_json，与状态表 + 一次编码
+TOKENS_PER_POOL = 700
+CONNECTIONS = 10
+TICKS = 5
+
+
+def make_raw_pools(seed: int):
+    rng = random.Random(seed)
+    pools = {}
+    for pool_key, chain_id in zip(POOL_KEYS, ("solana", "base", "bsc")):
+        profiles_list = []
+        data_list = []
+        for i in range(TOKENS_PER_POOL):
+            address = f"{chain_id}_token_{i:06d}"
+            profiles_list.append({
+                'chainId': chain_id,
+                'tokenAddress': address,
+                'icon': f"https://dd.dexscreener.com/ds-data/tokens/{chain_id}/{address}.png",
+                'url': f"https://dexscreener.com/{chain_id}/{address}",
+            })
+            data_list.append({
+                'baseToken': {'symbol': f"TK{i}"},
+                'dexId': 'raydium',
+                'priceNative': f"{rng.random():.8f}",
+                'priceUsd': f"{rng.random() * 10:.8f}",
+                'txns': {k: {'buys': rng.randint(0, 5000), 'sells': rng.randint(0, 5000)} for k in ('m5', 'h1', 'h6', 'h24')},
+                'volume': {k: rng.random() * 1e6 for k in ('m5', 'h1', 'h6', 'h24')},
+                'priceChange': {k: round(rng.uniform(-50, 50), 2) for k in ('m5', 'h1', 'h6', 'h24')},
+                'liquidity': {'usd': rng.random() * 1e6, 'base': rng.random() * 1e9, 'quote': rng.random() * 1e3},
+            })
+        pools[pool_key] = (profiles_list, data_list)
+    return pools
+
+
+def dict_snapshot_tick(loop, data_fetcher, state, pools):
+    serialized = 0
+    data = {"timestamp": "2026-01-01 00:00:00"}
+    for pool_key, (profiles_list, data_list) in pools.items():
+        data[pool_key] = loop.run_until_complete(data_fetcher.filter_data_for_web(profiles_list, data_list))
+    state['data'] = data
+    for _ in range(CONNECTIONS):
+        # 与 starlette 的 send_json 相同的序列化方式
+        serialized += len(json.dumps({**data, "stale": False}, separators=(",", ":"), ensure_ascii=False))
+    return serialized
+
+
+def token_state_tick(snapshot, pools):
+    snapshot.update("2026-01-01 00:00:00", pools)
+    for _ in range(CONNECTIONS):
+        payload = snapshot.payload()
+    # 所有连接共用同一个字符串，只编码一次
+    return len(payload)
+
+
+def measure(tick):
+    tracemalloc.start()
+    peaks = []
+    for i in range(TICKS):
+        pools = make_raw_pools(i)
+        before = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        serialized = tick(pools)
+        peaks.append(tracemalloc.get_traced_memory()[1] - before)
+        del pools
+    retained = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return max(peaks), retained, serialized
+
+
+if __name__ == "__main__":
+    loop = asyncio.new_event_loop()
+    data_fetcher = DataFetcher()
+    state = {}
+    snapshot = SnapshotStore()
+
+    results = {
+        "dict snapshot": measure(lambda pools: dict_snapshot_tick(loop, data_fetcher, state, pools)),
+        "token state table": measure(lambda pools: token_state_tick(snapshot, pools)),
+    }
+    loop.close()
+
+    print(f"{TOKENS_PER_POOL * len(POOL_KEYS)} tokens, {CONNECTIONS} connections, {TICKS} ticks")
+    for name, (peak, retained, serialized) in results.items():
+        print(f"{name:>18}: peak per tick {peak / 1e6:6.2f} MB, retained {retained / 1e6:6.2f} MB, "
+              f"JSON encoded per tick {serialized / 1e6:6.2f} MB")
@@ -3,49 +3,101 @@ import asyncio
 import json
 from datetime import datetime
 from contextlib import asynccontextmanager
-from fastapi import FastAPI, WebSocket, HTTPException
+from fastapi import FastAPI, WebSocket, HTTPException, Response
 from fastapi.middleware.cors import CORSMiddleware
 import os
 
 from data_fetcher import DataFetcher
+from snapshot import SnapshotStore
 from websocket import manager
 
 
-async def get_full_data(data_fetcher: DataFetcher, username=None):
-    """获取完整的数据，包括基础数据和用户收藏（如果有）"""
+async def fetch_pool_data(data_fetcher: DataFetcher):
+    """拉取各条链的 token 池原始数据，返回 (timestamp, {池名: (profiles_list, data_list)})"""
     solana_token_list = await data_fetcher.only_solana_token_profiles_list()
     solana_token_data = await data_fetcher.fetch_data_for_token_profiles_list(solana_token_list, "solana")
-    solana_filtered_data = await data_fetcher.filter_data_for_web(solana_token_list, solana_token_data)
     
     base_token_list = await data_fetcher.only_base_token_profiles_list()
     base_token_data = await data_fetcher.fetch_data_for_token_profiles_list(base_token_list, "base")
-    base_filtered_data = await data_fetcher.filter_data_for_web(base_token_list, base_token_data)
 
     bsc_token_list = await data_fetcher.only_bsc_token_profiles_list()
     bsc_token_data = await data_fetcher.fetch_data_for_token_profiles_list(bsc_token_list, "bsc")
-    bsc_filtered_data = await data_fetcher.filter_data_for_web(bsc_token_list, bsc_token_data)
 
-    data = {
-        "timestamp": str(datetime.now().strftime("%Y-%m-%d %H:%M:%S")),
-        "solana_pool": solana_filtered_data,
-        "base_pool": base_filtered_data,
-        "bsc_pool": bsc_filtered_data
+    timestamp = str(datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+    return timestamp, {
+        "solana_pool": (solana_token_list, solana_token_data),
+        "base_pool": (base_token_list, base_token_data),
+        "bsc_pool": (bsc_token_list, bsc_token_data)
     }
-    
+
+
+UPDATE_INTERVAL = 10
+# 超过该时间未刷新的数据标记为 stale，请求时等待刷新完成再返回
+STALE_AFTER = UPDATE_INTERVAL * 6
+
+_refresh_task = None
+
+
+async def refresh_snapshot(data_fetcher: DataFetcher):
+    try:
+        timestamp, pools = await fetch_pool_data(data_fetcher)
+        # 所有池拉取完成后再一次性更新状态表，编码时不会读到半更新的数据
+        if not snapshot.update(timestamp, pools):
+            print("All pools came back empty, keeping the previous snapshot")
+            return
+        # 每个周期只编码一次，发送和写盘共用
+        snapshot.payload()
+        await asyncio.to_thread(snapshot.checkpoint)
+    except Exception as e:
+        print(f"Error refreshing snapshot: {e}")
+
+
+def ensure_snapshot_refresh():
+    """启动一次快照刷新；已有刷新在进行时复用同一个任务，避免并发重复拉取"""
+    global _refresh_task
+    if _refresh_task is None or _refresh_task.done():
+        _refresh_task = asyncio.create_task(refresh_snapshot(data_fetcher))
+    return _refresh_task
+
+
+async def get_full_payload(data_fetcher: DataFetcher, username=None) -> str:
+    """获取完整数据的 JSON 文本，包括基础数据和用户收藏（如果有）"""
+    # 没有数据，或内存中的数据已经过旧时等待刷新；磁盘快照直接返回，由后台刷新
+    if not snapshot.has_data or (snapshot.is_expired(STALE_AFTER) and not snapshot.loaded_from_disk):
+        # shield: 单个请求被取消时不影响其他等待同一刷新的请求
+        await asyncio.shield(ensure_snapshot_refresh())
+    elif snapshot.is_expired(UPDATE_INTERVAL):
+        # 先返回已有快照，后台刷新
+        ensure_snapshot_refresh()
+
+    favorites_json = None
     if username:
-        data['favorite_tokens'] = await data_fetcher.fetch_data_for_user_favorite(username)
-    
-    return data
+        favorite_tokens = await data_fetcher.fetch_data_for_user_favorite(username)
+        favorites_json = json.dumps(favorite_tokens, ensure_ascii=False, separators=(",", ":"))
 
+    payload = snapshot.payload(favorites_json)
+    if payload is None:
+        raise RuntimeError("No pool data available")
+    return payload
 
-async def periodic_data_update(time_interval=10):
+
+def success_response(payload: str, **fields) -> Response:
+    """把已编码的数据放进 {"status": "success", ..., "data": ...} 响应，不再重新序列化"""
+    head = json.dumps({"status": "success", **fields}, ensure_ascii=False, separators=(",", ":"))
+    return Response(content=head[:-1] + ',"data":' + payload + '}', media_type="application/json")
+
+
+async def periodic_data_update(time_interval=UPDATE_INTERVAL):
     while True:
         try:
+            # 没有连接时不拉取；有连接时每个周期只拉取一次池数据，所有连接共用
+            if manager.active_connections:
+                await asyncio.shield(ensure_snapshot_refresh())
             for connection in manager.active_connections:
                 try:
                     username = getattr(connection, 'username', None)
-                    data = await get_full_data(data_fetcher, username)
-                    await manager.send_personal_message(data, connection)
+                    payload = await get_full_payload(data_fetcher, username)
+                    await manager.send_personal_text(payload, connection)
                 except Exception as e:
                     print(f"Error sending data to connection: {e}")
                     continue
@@ -58,9 +110,15 @@ async def periodic_data_update(time_interval=10):
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    # 冷启动时先加载上次的快照，后台刷新完成前以 stale 标记提供服务
+    if snapshot.load():
+        ensure_snapshot_refresh()
     update_task = asyncio.create_task(periodic_data_update())
     yield
     update_task.cancel()
+    if _refresh_task is not None:
+        _refresh_task.cancel()
+    snapshot.checkpoint(force=True)
     await data_fetcher.close_session()
 
 
@@ -84,6 +142,7 @@ app.add_middleware(
 )
 
 data_fetcher = DataFetcher()
+snapshot = SnapshotStore(stale_after=STALE_AFTER)
 
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
@@ -100,18 +159,25 @@ async def websocket_endpoint(websocket: WebSocket):
         
         # 发送初始连接成功消息
         await websocket.send_json({"type": "connection_established", "message": "WebSocket connection established"})
+
+        # 有快照时立即推送，不等待下一个更新周期
+        cached_payload = snapshot.payload()
+        if cached_payload is not None:
+            await manager.send_personal_text(cached_payload, websocket)
+        if snapshot.is_expired(UPDATE_INTERVAL):
+            ensure_snapshot_refresh()
         
         while True:
             data = await websocket.receive_json()
             print(f"Received WebSocket data: {data}")
             if data.get('type') == 'login':
                 manager.set_username(websocket, data['username'])
-                user_data = await get_full_data(data_fetcher, data['username'])
-                await manager.send_personal_message(user_data, websocket)
+                user_payload = await get_full_payload(data_fetcher, data['username'])
+                await manager.send_personal_text(user_payload, websocket)
             elif data.get('type') == 'request_update':
                 username = getattr(websocket, 'username', None)
-                data = await get_full_data(data_fetcher, username)
-                await manager.send_personal_message(data, websocket)
+                payload = await get_full_payload(data_fetcher, username)
+                await manager.send_personal_text(payload, websocket)
     except Exception as e:
         print(f"WebSocket error: {e}")
         import traceback
@@ -136,12 +202,8 @@ async def login(credentials: dict):
         if (user["username"] == credentials["username"] and 
             user["password"] == credentials["password"]):
             async with DataFetcher() as fetcher:
-                data = await get_full_data(fetcher, user["username"])
-                return {
-                    "status": "success",
-                    "username": user["username"],
-                    "data": data
-                }
+                payload = await get_full_payload(fetcher, user["username"])
+                return success_response(payload, username=user["username"])
     raise HTTPException(status_code=401, detail="Invalid credentials")
 
 def update_user_favorites(username, token_data):
@@ -187,10 +249,7 @@ async def add_favorite(data: dict):
         }):
             # 返回更新后的完整数据
             async with DataFetcher() as fetcher:
-                return {
-                    "status": "success",
-                    "data": await get_full_data(fetcher, username)
-                }
+                return success_response(await get_full_payload(fetcher, username))
         else:
             raise HTTPException(status_code=500, detail="Failed to update favorites")
             
@@ -233,10 +292,7 @@ async def delete_favorite(data: dict):
         if delete_user_favorite(username, token_address):
             # 返回更新后的完整数据
             async with DataFetcher() as fetcher:
-                return {
-                    "status": "success",
-                    "data": await get_full_data(fetcher, username)
-                }
+                return success_response(await get_full_payload(fetcher, username))
         else:
             raise HTTPException(status_code=500, detail="Failed to delete favorite")
             
@@ -252,8 +308,8 @@ async def test():
 async def get_data():
     """提供轮询数据的接口，作为 WebSocket 的备用方案"""
     try:
-        data = await get_full_data(data_fetcher)
-        return data
+        payload = await get_full_payload(data_fetcher)
+        return Response(content=payload, media_type="application/json")
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -0,0 +1,143 @@
+import math
+import os
+import time
+from json.encoder import encode_basestring
+from typing import Dict, Any, List, Optional, Tuple
+
+from token_state import TokenStateTable
+
+
+# 快照文件路径，默认写到 /tmp；新的 Cloud Run 实例不会继承本地磁盘，需要挂载卷才能跨实例保留
+SNAPSHOT_PATH = os.getenv("SNAPSHOT_PATH", "/tmp/alphaseek_snapshot.json")
+# 两次写盘之间的最小间隔（秒）
+SNAPSHOT_CHECKPOINT_INTERVAL = int(os.getenv("SNAPSHOT_CHECKPOINT_INTERVAL", "60"))
+
+POOL_KEYS = ("solana_pool", "base_pool", "bsc_pool")
+
+# payload 以 stale 字段结尾，切换标记时只替换结尾，不重新编码
+_STALE_SUFFIXES = {False: ',"stale":false}', True: ',"stale":true}'}
+
+
+class SnapshotStore:
+    """保存最新的 token 池快照，并定期写入本地文件，冷启动时可直接加载
+
+    池数据只保存在 token 状态表中，发送时按需编码成 JSON 文本，每次刷新只编码一次。
+    数据超过 stale_after 秒未刷新，或是从磁盘加载的，都会带上 "stale": true。
+    """
+
+    def __init__(self, path: str = SNAPSHOT_PATH, checkpoint_interval: int = SNAPSHOT_CHECKPOINT_INTERVAL,
+                 stale_after: float = 60):
+        self.path = path
+        self.checkpoint_interval = checkpoint_interval
+        self.stale_after = stale_after
+        self.table = TokenStateTable()
+        self.timestamp: Optional[str] = None
+        # 当前数据来自磁盘快照，尚未成功刷新过
+        self.loaded_from_disk = False
+        self.updated_at = 0.0
+        # 不含收藏的完整 JSON payload 缓存，及其结尾的 stale 标记
+        self._payload: Optional[str] = None
+        self._payload_stale = False
+        # 上次写入（或加载）的快照文件中有数据的池
+        self._checkpointed_pools = set()
+        self._last_checkpoint = 0.0
+
+    @property
+    def has_data(self) -> bool:
+        return self._payload is not None or self.timestamp is not None
+
+    def update(self, timestamp: str, pools: Dict[str, Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]]) -> bool:
+        """用新拉取的数据更新快照；所有池都为空时（通常是上游请求失败）保留原数据并返回 False"""
+        if not any(profiles_list and data_list for profiles_list, data_list in pools.values()):
+            return False
+        self.table.update(pools)
+        self.timestamp = timestamp
+        self.loaded_from_disk = False
+        self.updated_at = time.monotonic()
+        self._payload = None
+        return True
+
+    def age(self) -> float:
+        if self.loaded_from_disk or self.timestamp is None:
+            return math.inf
+        return time.monotonic() - self.updated_at
+
+    def is_expired(self, max_age: float) -> bool:
+        return self.age() > max_age
+
+    def payload(self, favorites_json: Optional[str] = None) -> Optional[str]:
+        """返回 JSON 文本；传入收藏的 JSON 时附加 favorite_tokens 字段"""
+        stale = self.is_expired(self.stale_after)
+        if self._payload is None:
+            if self.timestamp is None:
+                return None
+            # 各部分一次拼接，避免大字符串反复复制
+            parts = ['{"timestamp":', encode_basestring(self.timestamp)]
+            for key in POOL_KEYS:
+                parts += [',', encode_basestring(key), ':[', self.table.encode_pool_items(key), ']']
+            parts.append(_STALE_SUFFIXES[stale])
+            self._payload = ''.join(parts)
+            self._payload_stale = stale
+        elif self._payload_stale != stale:
+            self._payload = self._payload[:-len(_STALE_SUFFIXES[self._payload_stale])] + _STALE_SUFFIXES[stale]
+            self._payload_stale = stale
+        if favorites_json is None:
+            return self._payload
+        return self._payload[:-1] + ',"favorite_tokens":' + favorites_json + '}'
+
+    def load(self) -> bool:
+        """从磁盘加载上次的快照，加载的数据标记为 stale
+
+        文件内容就是之前编码好的 payload，只做结构检查，不重新解析和编码。
+        """
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                text = f.read()
+        except FileNotFoundError:
+            return False
+        except Exception as e:
+            print(f"Error loading snapshot: {e}")
+            return False
+
+        payload_stale = text.endswith(_STALE_SUFFIXES[True])
+        if (not text.startswith('{"timestamp":')
+                or not (payload_stale or text.endswith(_STALE_SUFFIXES[False]))
+                or not all(f'"{key}":[' in text for key in POOL_KEYS)):
+            print(f"Ignoring invalid snapshot in {self.path}")
+            return False
+
+        self._payload = text
+        self._payload_stale = payload_stale
+        self._checkpointed_pools = {key for key in POOL_KEYS if f'"{key}":[]' not in text}
+        self.loaded_from_disk = True
+        timestamp = text[len('{"timestamp":'):text.find(',')]
+        print(f"Loaded snapshot from {self.path} ({timestamp})")
+        return True
+
+    def checkpoint(self, force: bool = False) -> bool:
+        """写入快照文件，先写临时文件再替换，避免留下半个文件
+
+        只写入已经编码好的 payload，可以在线程中调用。
+        """
+        payload = self._payload
+        if self.loaded_from_disk or payload is None:
+            return False
+        filled_pools = {key for key in POOL_KEYS if self.table.pools.get(key)}
+        # 某条链的请求失败时该池为空，不能覆盖之前快照中这条链的数据；
+        # 该链恢复有数据后才会继续写盘
+        if not filled_pools or self._checkpointed_pools - filled_pools:
+            return False
+        now = time.monotonic()
+        if not force and now - self._last_checkpoint < self.checkpoint_interval:
+            return False
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(payload)
+            os.replace(tmp_path, self.path)
+            self._checkpointed_pools = filled_pools
+            self._last_checkpoint = now
+            return True
+        except Exception as e:
+            print(f"Error writing snapshot: {e}")
+            return False
@@ -0,0 +1,271 @@
+import json
+import math
+import sys
+from array import array
+from json.encoder import encode_basestring
+from typing import Dict, Any, List, Tuple
+
+from strategy import get_token_tag
+
+
+# 从交易对数据中提取的字段: (字段名, 路径)
+OBJECT_PAIR_FIELDS = (
+    ('symbol', ('baseToken', 'symbol')),
+    ('dexId', ('dexId',)),
+    ('priceNative', ('priceNative',)),
+    ('priceUsd', ('priceUsd',)),
+)
+INT_PAIR_FIELDS = (
+    ('txns_m5_buy', ('txns', 'm5', 'buys')),
+    ('txns_m5_sell', ('txns', 'm5', 'sells')),
+    ('txns_h1_buy', ('txns', 'h1', 'buys')),
+    ('txns_h1_sell', ('txns', 'h1', 'sells')),
+    ('txns_h6_buy', ('txns', 'h6', 'buys')),
+    ('txns_h6_sell', ('txns', 'h6', 'sells')),
+    ('txns_h24_buy', ('txns', 'h24', 'buys')),
+    ('txns_h24_sell', ('txns', 'h24', 'sells')),
+)
+FLOAT_PAIR_FIELDS = (
+    ('volume_m5', ('volume', 'm5')),
+    ('volume_h1', ('volume', 'h1')),
+    ('volume_h6', ('volume', 'h6')),
+    ('volume_h24', ('volume', 'h24')),
+    ('priceChange_m5', ('priceChange', 'm5')),
+    ('priceChange_h1', ('priceChange', 'h1')),
+    ('priceChange_h6', ('priceChange', 'h6')),
+    ('priceChange_h24', ('priceChange', 'h24')),
+    ('liquidity_usd', ('liquidity', 'usd')),
+    ('liquidity_base', ('liquidity', 'base')),
+    ('liquidity_quote', ('liquidity', 'quote')),
+)
+
+OBJECT_FIELD_NAMES = ('tokenAddress', 'chainId', 'icon', 'url', 'tag') + tuple(name for name, _ in OBJECT_PAIR_FIELDS)
+INT_FIELD_NAMES = tuple(name for name, _ in INT_PAIR_FIELDS)
+FLOAT_FIELD_NAMES = tuple(name for name, _ in FLOAT_PAIR_FIELDS)
+
+# 与 filter_data_for_web 输出相同的字段顺序
+WEB_FIELD_NAMES = (
+    ('tokenAddress', 'icon', 'url', 'chainId', 'symbol', 'dexId', 'priceNative', 'priceUsd')
+    + INT_FIELD_NAMES + FLOAT_FIELD_NAMES + ('tag',)
+)
+
+# 整数列用该值表示 None，浮点列用 NaN 表示 None；
+# 与列类型不符的值（字符串、bool、超出范围的整数等）写入同样的占位值，原值存入溢出表，编码时原样输出
+INT_NONE = -2 ** 63
+INT_MAX = 2 ** 63 - 1
+# 绝对值不超过该值的整数可以无损存入 float 列
+FLOAT_EXACT_INT = 2 ** 53
+
+_MISSING = {}
+
+
+def _get_path(data: Dict[str, Any], path: Tuple[str, ...]):
+    for key in path[:-1]:
+        data = data.get(key, _MISSING)
+    return data.get(path[-1], None)
+
+
+def _intern(value):
+    return sys.intern(value) if type(value) is str else value
+
+
+def _encode_object(value) -> str:
+    if value is None:
+        return 'null'
+    if type(value) is str:
+        return encode_basestring(value)
+    # 上游字段偶尔不是字符串，退回到标准 JSON 编码
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+
+
+class _RowView:
+    """按 dict 的方式读取一行，供 get_token_tag 等函数使用，不复制数据"""
+
+    __slots__ = ('table', 'row')
+
+    def __init__(self, table: 'TokenStateTable'):
+        self.table = table
+        self.row = 0
+
+    def get(self, name: str, default=None):
+        return self.table.get_value(self.row, name, default)
+
+
+class TokenStateTable:
+    """常驻内存的 token 状态表，以 (chainId, tokenAddress) 为键，只由池数据刷新更新
+
+    每个字段一列: 交易笔数存 array('q')，成交量/涨跌幅/流动性存 array('d')，其他字段存 list。
+    float 列另有一个 array('b') 记录原值是否为整数，保证编码结果与原始 JSON 一致。
+    每个 token 占用一行，刷新时原地覆盖，离开池的 token 释放的行会被复用。
+    """
+
+    def __init__(self, capacity: int = 256):
+        # chainId -> tokenAddress -> 行号；chainId 用 sys.intern，tokenAddress 以这里的键为唯一实例
+        self.rows: Dict[str, Dict[str, int]] = {}
+        # 池名 -> 本次刷新的行号（保持原始顺序）
+        self.pools: Dict[str, array] = {}
+        self.capacity = 0
+        self._free: List[int] = []
+        self._objects = {name: [] for name in OBJECT_FIELD_NAMES}
+        self._ints = {name: array('q') for name in INT_FIELD_NAMES}
+        self._floats = {name: array('d') for name in FLOAT_FIELD_NAMES}
+        self._float_is_int = {name: array('b') for name in FLOAT_FIELD_NAMES}
+        # 行号 -> {字段名: 无法存入数值列的原值}
+        self._overflow: Dict[int, Dict[str, Any]] = {}
+        self._view = _RowView(self)
+        self._grow(capacity)
+
+    def __len__(self):
+        return self.capacity - len(self._free)
+
+    def _grow(self, capacity: int):
+        extra = capacity - self.capacity
+        for column in self._objects.values():
+            column.extend([None] * extra)
+        for column in self._ints.values():
+            column.extend([INT_NONE] * extra)
+        for column in self._floats.values():
+            column.extend([math.nan] * extra)
+        for column in self._float_is_int.values():
+            column.extend([0] * extra)
+        # 倒序放入，优先复用小行号
+        self._free.extend(range(capacity - 1, self.capacity - 1, -1))
+        self.capacity = capacity
+
+    def _allocate(self) -> int:
+        if not self._free:
+            # 按 25% 扩容，避免为 2000 个左右的 token 预留一倍的空行
+            self._grow(self.capacity + max(self.capacity // 4, 64))
+        return self._free.pop()
+
+    def _release(self, row: int):
+        # 释放字符串等引用，数值列在下次写入时覆盖
+        for column in self._objects.values():
+            column[row] = None
+        self._overflow.pop(row, None)
+        self._free.append(row)
+
+    def get_value(self, row: int, name: str, default=None):
+        if name in self._ints:
+            value = self._ints[name][row]
+            if value == INT_NONE:
+                return self._overflow.get(row, _MISSING).get(name)
+            return value
+        if name in self._floats:
+            value = self._floats[name][row]
+            if value != value:
+                return self._overflow.get(row, _MISSING).get(name)
+            return int(value) if self._float_is_int[name][row] else value
+        if name in self._objects:
+            return self._objects[name][row]
+        return default
+
+    def _write_row(self, row: int, token: Dict[str, Any], data: Dict[str, Any]):
+        objects = self._objects
+        objects['icon'][row] = token.get('icon', None)
+        objects['url'][row] = token.get('url', None)
+        for name, path in OBJECT_PAIR_FIELDS:
+            objects[name][row] = _get_path(data, path)
+        objects['dexId'][row] = _intern(objects['dexId'][row])
+        overflow = {}
+        for name, path in INT_PAIR_FIELDS:
+            value = _get_path(data, path)
+            if type(value) is int and INT_NONE < value <= INT_MAX:
+                self._ints[name][row] = value
+            else:
+                self._ints[name][row] = INT_NONE
+                if value is not None:
+                    overflow[name] = value
+        for name, path in FLOAT_PAIR_FIELDS:
+            value = _get_path(data, path)
+            value_type = type(value)
+            if value_type is float and math.isfinite(value):
+                self._floats[name][row] = value
+                self._float_is_int[name][row] = 0
+            elif value_type is int and -FLOAT_EXACT_INT <= value <= FLOAT_EXACT_INT:
+                self._floats[name][row] = value
+                self._float_is_int[name][row] = 1
+            else:
+                self._floats[name][row] = math.nan
+                if value is not None:
+                    overflow[name] = value
+        if overflow:
+            self._overflow[row] = overflow
+        else:
+            self._overflow.pop(row, None)
+        self._view.row = row
+        objects['tag'][row] = get_token_tag(self._view)
+
+    def update(self, pools: Dict[str, Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]]):
+        """用一次刷新拉取的 {池名: (profiles_list, data_list)} 原地更新状态表
+
+        同一次刷新中重复的 (chainId, tokenAddress) 只保留第一条，
+        不在本次刷新中的 token 会从表中移除。
+        """
+        live = set()
+        self.pools = {}
+        for pool_name, (profiles_list, data_list) in pools.items():
+            pool_rows = array('q')
+            for token, data in zip(profiles_list, data_list):
+                chain_id = token.get('chainId', None)
+                token_address = token.get('tokenAddress', None)
+                chain_rows = self.rows.get(chain_id)
+                if chain_rows is None:
+                    chain_rows = self.rows[_intern(chain_id)] = {}
+                row = chain_rows.get(token_address)
+                if row is None:
+                    row = self._allocate()
+                    chain_rows[token_address] = row
+                    self._objects['tokenAddress'][row] = token_address
+                    self._objects['chainId'][row] = _intern(chain_id)
+                elif row in live:
+                    continue
+                live.add(row)
+                self._write_row(row, token, data)
+                pool_rows.append(row)
+            self.pools[pool_name] = pool_rows
+
+        for chain_rows in self.rows.values():
+            for token_address in [address for address, row in chain_rows.items() if row not in live]:
+                self._release(chain_rows.pop(token_address))
+
+    def encode_pool_items(self, pool_name: str) -> str:
+        """把一个池直接从列数据编码成以逗号分隔的 JSON 对象（不含外层方括号），不创建中间 dict"""
+        encoders = [(encode_basestring(name) + ':', self._column_encoder(name)) for name in WEB_FIELD_NAMES]
+        return ','.join([
+            '{' + ','.join([prefix + encode(row) for prefix, encode in encoders]) + '}'
+            for row in self.pools.get(pool_name, ())
+        ])
+
+    def _column_encoder(self, name: str):
+        """返回把某一行的该字段编码成 JSON 的函数，占位值从溢出表取原值"""
+        overflow = self._overflow
+
+        if name in self._ints:
+            column = self._ints[name]
+
+            def encode_int(row: int) -> str:
+                value = column[row]
+                if value == INT_NONE:
+                    return _encode_object(overflow.get(row, _MISSING).get(name))
+                return int.__repr__(value)
+            return encode_int
+
+        if name in self._floats:
+            column = self._floats[name]
+            is_int = self._float_is_int[name]
+
+            def encode_float(row: int) -> str:
+                value = column[row]
+                if value != value:
+                    return _encode_object(overflow.get(row, _MISSING).get(name))
+                if is_int[row]:
+                    return int.__repr__(int(value))
+                return float.__repr__(value)
+            return encode_float
+
+        column = self._objects[name]
+
+        def encode_object(row: int) -> str:
+            return _encode_object(column[row])
+        return encode_object
@@ -17,6 +17,9 @@ class ConnectionManager:
     async def send_personal_message(self, message: dict, websocket: WebSocket):
         await websocket.send_json(message)
 
+    async def send_personal_text(self, message: str, websocket: WebSocket):
+        await websocket.send_text(message)
+
     def set_username(self, websocket: WebSocket, username: str):
         websocket.username = username
         print(f"Set username {username} for connection")